@@ -1,146 +1,298 @@
-from flask import Flask, request, jsonify
+from quart import Quart, request, jsonify
+from collections import OrderedDict, deque
+from typing import Any, Union
+import asyncio
+import hashlib
+import jiter
 import json
+import math
+import orjson
 import os
-from flask_cors import CORS
+import re
+import sys
+import threading
+import time
+import numpy as np
+from quart_cors import cors
 from dotenv import load_dotenv
-from openai import OpenAI
+from hypercorn.config import Config
+from hypercorn.run import run
+from openai import APIConnectionError, APITimeoutError, AsyncOpenAI, InternalServerError, RateLimitError
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+import httpx
+import ssl
+import tiktoken
 
 load_dotenv()
 
-app = Flask(__name__)
-CORS(app, supports_credentials=True)
+app = Quart(__name__)
+# Reflect any request origin, since a wildcard origin cannot be combined with credentials
+app = cors(app, allow_origin=re.compile(r".*"), allow_credentials=True)
 
 # Configure OpenAI
 openai_api_key = os.getenv("OPENAI_API_KEY")
-openai_client = OpenAI()
-
+# The key is fixed for the life of the process, so check it once here instead of on every request
 if not openai_api_key:
-    print("WARNING: OPENAI_API_KEY environment variable not set. You need to set it before running this application.")
+    raise RuntimeError(
+        "OPENAI_API_KEY environment variable not set. To set it, run: export OPENAI_API_KEY=your_api_key_here"
+    )
+# Share one SSL context and connection pool across all OpenAI calls so TCP/TLS sessions are reused
+ssl_context = ssl.create_default_context()
+http_client = httpx.AsyncClient(
+    verify=ssl_context,
+    limits=httpx.Limits(max_connections=200, max_keepalive_connections=100, keepalive_expiry=60)
+)
+# The SDK retries connection errors, timeouts, 429s and 5xx with exponential backoff, honouring Retry-After.
+# OPENAI_TIMEOUT bounds each read of a stream; non-streaming calls send nothing until generation is done,
+# so they also get time for max_tokens at OPENAI_MIN_TOKENS_PER_SECOND (see completion_timeout).
+# A non-streaming call, retries included, must finish within one attempt's timeout plus OPENAI_RETRY_BUDGET:
+# quick failures are still retried, but an attempt that timed out is not generated again from scratch.
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "15"))
+OPENAI_MIN_TOKENS_PER_SECOND = float(os.getenv("OPENAI_MIN_TOKENS_PER_SECOND", "40"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+OPENAI_RETRY_BUDGET = float(os.getenv("OPENAI_RETRY_BUDGET", "10"))
+openai_client = AsyncOpenAI(
+    api_key=openai_api_key,
+    http_client=http_client,
+    timeout=OPENAI_TIMEOUT,
+    max_retries=OPENAI_MAX_RETRIES
+)
+# Batched calls are not retried: a failed batch falls back to one (retried) call per request instead
+batch_openai_client = openai_client.with_options(max_retries=0)
+
+# Errors that suggest OpenAI itself is degraded, counted by the circuit breaker
+TRANSIENT_OPENAI_ERRORS = (APIConnectionError, RateLimitError, InternalServerError)
+
+# Configure the circuit breaker: after this many consecutive failed calls (each already retried by the SDK),
+# fail fast for BREAKER_RESET_TIMEOUT seconds before letting a trial call through
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+
+# Reject payloads whose rendered prompt would exceed this many tokens
+MAX_PROMPT_TOKENS = int(os.getenv("MAX_PROMPT_TOKENS", "3000"))
+# Tokenizer used to count prompt tokens, loaded in the background by load_token_encoding
+_token_encoding = None
+
+# Configure the analysis cache
+ANALYSIS_CACHE_TTL = int(os.getenv("ANALYSIS_CACHE_TTL", "3600"))
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "1024"))
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.97"))
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Configure model routing: most matches go to the cheaper model, ambiguous or detailed ones to the stronger one
+DEFAULT_MODEL = os.getenv("ANALYSIS_MODEL", "gpt-4o-mini")
+DEEP_REASONING_MODEL = os.getenv("DEEP_REASONING_MODEL", "gpt-4o")
+AMBIGUOUS_MATCH_RANGE = (40, 70)
+DETAILED_PROFILE_FIELDS = 12
+
+# Configure micro-batching: concurrent analyses arriving within BATCH_WAIT_MS share one OpenAI call.
+# Off by default: it trades latency (the wait, and one longer completion per batch) for fewer calls.
+BATCHING_ENABLED = os.getenv("ANALYSIS_BATCHING_ENABLED", "false").lower() in ("1", "true", "yes")
+MAX_BATCH_SIZE = int(os.getenv("ANALYSIS_MAX_BATCH_SIZE", "8"))
+BATCH_WAIT_MS = int(os.getenv("ANALYSIS_BATCH_WAIT_MS", "30"))
+MAX_OUTPUT_TOKENS = 16384
+
+# Configure the completion token cap: start at MAX_COMPLETION_TOKENS, then track the p95 of observed
+# completion sizes (plus headroom) within [MIN_COMPLETION_TOKENS, COMPLETION_TOKENS_CEILING]
+MAX_COMPLETION_TOKENS = int(os.getenv("MAX_COMPLETION_TOKENS", "800"))
+MIN_COMPLETION_TOKENS = 400
+COMPLETION_TOKENS_CEILING = 1500
+COMPLETION_TOKENS_HEADROOM = 1.25
+COMPLETION_TOKENS_MIN_SAMPLES = 20
 
-def normalize_analysis_response(analysis):
+# Completion tokens used per analysis by recent OpenAI calls
+_completion_token_samples = deque(maxlen=200)
+
+# Queue of (prompt, model, future) items and the task draining it; both exist only while the app is serving
+_batch_queue = None
+_batcher_task = None
+_batch_tasks = set()
+
+# Analyses in progress, by cache key, so identical concurrent requests share one OpenAI call
+_inflight = {}
+
+# Exact-match cache: key -> (expires_at, analysis), kept in LRU order
+_analysis_cache = OrderedDict()
+# Semantic cache: key -> (scope, unit-normalized prompt embedding), kept in insertion order.
+# Lookups only compare entries with the same scope (match percentage and model).
+_semantic_entries = OrderedDict()
+_cache_lock = threading.Lock()
+
+def make_cache_key(member_data, job_data, match_percentage):
     """
-    Normalize the analysis response to ensure consistent data types
+    Build a stable hash of the inputs that determine the analysis
     """
-    normalized = {
-        "match_explanation": "",
-        "strengths": [],
-        "gaps": [],
-        "recommendations": []
-    }
-    
-    # Ensure match_explanation is a string
-    if "match_explanation" in analysis:
-        if isinstance(analysis["match_explanation"], str):
-            normalized["match_explanation"] = analysis["match_explanation"]
-        else:
-            normalized["match_explanation"] = str(analysis["match_explanation"])
-    
-    # Ensure strengths is an array
-    if "strengths" in analysis:
-        if isinstance(analysis["strengths"], list):
-            normalized["strengths"] = analysis["strengths"]
-        elif isinstance(analysis["strengths"], str):
-            # If it's a string, split by common delimiters or make it a single item array
-            if analysis["strengths"].strip():
-                # Try to split by common delimiters
-                strengths_str = analysis["strengths"]
-                if '\n' in strengths_str:
-                    normalized["strengths"] = [s.strip() for s in strengths_str.split('\n') if s.strip()]
-                elif ';' in strengths_str:
-                    normalized["strengths"] = [s.strip() for s in strengths_str.split(';') if s.strip()]
-                elif ',' in strengths_str:
-                    normalized["strengths"] = [s.strip() for s in strengths_str.split(',') if s.strip()]
-                else:
-                    normalized["strengths"] = [strengths_str]
-        else:
-            normalized["strengths"] = [str(analysis["strengths"])]
-    
-    # Ensure gaps is an array
-    if "gaps" in analysis:
-        if isinstance(analysis["gaps"], list):
-            normalized["gaps"] = analysis["gaps"]
-        elif isinstance(analysis["gaps"], str):
-            if analysis["gaps"].strip():
-                # Try to split by common delimiters
-                gaps_str = analysis["gaps"]
-                if '\n' in gaps_str:
-                    normalized["gaps"] = [s.strip() for s in gaps_str.split('\n') if s.strip()]
-                elif ';' in gaps_str:
-                    normalized["gaps"] = [s.strip() for s in gaps_str.split(';') if s.strip()]
-                elif ',' in gaps_str:
-                    normalized["gaps"] = [s.strip() for s in gaps_str.split(',') if s.strip()]
-                else:
-                    normalized["gaps"] = [gaps_str]
-        else:
-            normalized["gaps"] = [str(analysis["gaps"])]
-    
-    # Ensure recommendations is an array
-    if "recommendations" in analysis:
-        if isinstance(analysis["recommendations"], list):
-            normalized["recommendations"] = analysis["recommendations"]
-        elif isinstance(analysis["recommendations"], str):
-            if analysis["recommendations"].strip():
-                # Try to split by common delimiters
-                rec_str = analysis["recommendations"]
-                if '\n' in rec_str:
-                    normalized["recommendations"] = [s.strip() for s in rec_str.split('\n') if s.strip()]
-                elif ';' in rec_str:
-                    normalized["recommendations"] = [s.strip() for s in rec_str.split(';') if s.strip()]
-                elif ',' in rec_str:
-                    normalized["recommendations"] = [s.strip() for s in rec_str.split(',') if s.strip()]
-                else:
-                    normalized["recommendations"] = [rec_str]
-        else:
-            normalized["recommendations"] = [str(analysis["recommendations"])]
-    
-    return normalized
+    inputs = {"member": member_data, "jobpost": job_data, "Matching_Percentage": match_percentage}
+    try:
+        payload = orjson.dumps(inputs, option=orjson.OPT_SORT_KEYS, default=str)
+    except TypeError:
+        # orjson rejects integers beyond 64 bits, which are still valid JSON; the stdlib encoder handles them
+        payload = json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
 
-def analyze_job_match(data):
+def get_cached_analysis(key):
     """
-    Use OpenAI to analyze the job match and provide an explanation
+    Return the cached analysis for key, or None if missing or expired
     """
-    if not openai_api_key:
-        return {"error": "OpenAI API key not configured. Please set the OPENAI_API_KEY environment variable."}
-    
-    # Format the input data for the prompt
-    member_data = data.get("data", {}).get("member", {})
-    job_data = data.get("data", {}).get("jobpost", {})
-    match_percentage = data.get("data", {}).get("Matching_Percentage", 0)
-    
-    # Create a prompt for OpenAI
-    prompt = f"""
-You are an AI career advisor analyzing a job match. Here's the data:
-
-JOB POSTING:
-- Title: {job_data.get('JobTitle', 'N/A')}
-- Required Skills: {job_data.get('Required_Skills', 'N/A')}
-- Preferred Skills: {job_data.get('PreferredSkills', 'N/A')}
-- Qualifications: {job_data.get('Qualifications', 'N/A')}
-- Responsibilities: {job_data.get('Key_Responsibilities', 'N/A')}
-- Industry: {job_data.get('Industry', 'N/A')}
-- Role: {job_data.get('Role', 'N/A')}
-- Location: {job_data.get('JobLocation', 'N/A')}
+    with _cache_lock:
+        entry = _analysis_cache.get(key)
+        if entry is None:
+            return None
+        expires_at, analysis = entry
+        if expires_at < time.monotonic():
+            del _analysis_cache[key]
+            return None
+        _analysis_cache.move_to_end(key)
+        return analysis
 
-YOUR PROFILE:
-- Headline: {member_data.get('Headline', 'N/A')}
-- Technical Skills: {member_data.get('TechnicalSkillNames', 'N/A')}
-- Other Skills: {member_data.get('OtherSkills', 'N/A')}
-- Experience: {member_data.get('Experience', 'N/A')}
-- Job Titles: {member_data.get('JobTitles', 'N/A')}
-- Education: {member_data.get('Education', 'N/A')}
-- Communication Skills: {member_data.get('CommunicationNames', 'N/A')}
-- Leadership Skills: {member_data.get('LeadershipNames', 'N/A')}
-- Critical Thinking: {member_data.get('CriticalThinkingNames', 'N/A')}
-- Collaboration: {member_data.get('CollaborationNames', 'N/A')}
-- Character: {member_data.get('CharacterNames', 'N/A')}
-- Creativity: {member_data.get('CreativityNames', 'N/A')}
-- Growth Mindset: {member_data.get('GrowthMindsetNames', 'N/A')}
-- Mindfulness: {member_data.get('MindfulnessNames', 'N/A')}
-- Fortitude: {member_data.get('FortitudeNames', 'N/A')}
-- City: {member_data.get('CityName', 'N/A')}
+def semantic_scope(match_percentage, model):
+    """
+    Partition of the semantic cache a match belongs to. Near-duplicate prompts are only interchangeable
+    when they explain the same match percentage with the same model.
+    """
+    return (str(match_percentage), model)
 
-MATCH RESULT:
-- Match Percentage: {match_percentage}%
+def store_cached_analysis(key, analysis, embedding=None, scope=None):
+    """
+    Store an analysis in the exact-match cache and, if given, its prompt embedding in the semantic cache
+    """
+    with _cache_lock:
+        _analysis_cache[key] = (time.monotonic() + ANALYSIS_CACHE_TTL, analysis)
+        _analysis_cache.move_to_end(key)
+        while len(_analysis_cache) > ANALYSIS_CACHE_MAX_ENTRIES:
+            _analysis_cache.popitem(last=False)
+
+        if embedding is not None:
+            # Replace any earlier vector for this key rather than adding a duplicate
+            _semantic_entries.pop(key, None)
+            _semantic_entries[key] = (scope, embedding)
+        # Drop semantic entries whose analysis has been evicted from the exact-match cache, then the oldest
+        if len(_semantic_entries) > ANALYSIS_CACHE_MAX_ENTRIES:
+            for stale in [k for k in _semantic_entries if k not in _analysis_cache]:
+                del _semantic_entries[stale]
+            while len(_semantic_entries) > ANALYSIS_CACHE_MAX_ENTRIES:
+                _semantic_entries.popitem(last=False)
+
+async def embed_prompt(prompt):
+    """
+    Embed a prompt for the semantic cache, returning a unit-normalized vector
+    """
+    response = await openai_client.embeddings.create(model=EMBEDDING_MODEL, input=prompt)
+    vector = np.asarray(response.data[0].embedding, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+def find_similar_analysis(embedding, scope):
+    """
+    Return a cached analysis in the same scope whose prompt embedding is close enough to embedding, or None
+    """
+    with _cache_lock:
+        candidates = [(k, vector) for k, (entry_scope, vector) in _semantic_entries.items() if entry_scope == scope]
+    if not candidates:
+        return None
+    keys = [k for k, _ in candidates]
+    matrix = np.vstack([vector for _, vector in candidates])
+    similarities = matrix @ embedding
+    best = int(np.argmax(similarities))
+    if similarities[best] < SEMANTIC_CACHE_THRESHOLD:
+        return None
+    return get_cached_analysis(keys[best])
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling OpenAI while the circuit breaker is open
+    """
+
+class CircuitBreaker:
+    """
+    Fail fast while the upstream API is degraded. Opens after failure_threshold consecutive failures;
+    once reset_timeout has passed it lets one trial call through, closing again on success.
+    """
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = 0.0
+
+    def retry_after(self):
+        """
+        Seconds until the next trial call is allowed, or 0 if calls are allowed now
+        """
+        if self._failures < self.failure_threshold:
+            return 0
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self):
+        """
+        Return whether a call may go through now
+        """
+        if self.retry_after() > 0:
+            return False
+        if self._failures >= self.failure_threshold:
+            # Half-open: let this call through and hold the others back for another window
+            self._opened_at = time.monotonic()
+        return True
+
+    def record_success(self):
+        """
+        Close the breaker after a successful call
+        """
+        self._failures = 0
+
+    def record_failure(self):
+        """
+        Count a failed call, opening the breaker once the threshold is reached
+        """
+        self._failures += 1
+        if self._failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+
+openai_breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT)
+
+def completion_timeout(max_tokens):
+    """
+    Timeout for a non-streaming completion, long enough to generate max_tokens at the minimum expected rate
+    """
+    return OPENAI_TIMEOUT + max_tokens / OPENAI_MIN_TOKENS_PER_SECOND
+
+async def create_chat_completion(batch=False, **kwargs):
+    """
+    Call chat.completions.create through the circuit breaker.
+    Non-streaming calls, retries included, must finish within one attempt's timeout plus OPENAI_RETRY_BUDGET.
+    With batch=True the call is not retried and a timeout is not counted as an upstream failure.
+    """
+    if not openai_breaker.allow():
+        raise CircuitOpenError(
+            f"OpenAI is temporarily unavailable, retry in {math.ceil(openai_breaker.retry_after())} seconds"
+        )
+    deadline = None
+    if not kwargs.get("stream"):
+        timeout = kwargs.setdefault("timeout", completion_timeout(kwargs.get("max_tokens", MAX_COMPLETION_TOKENS)))
+        deadline = timeout + OPENAI_RETRY_BUDGET
+    client = batch_openai_client if batch else openai_client
+    try:
+        async with asyncio.timeout(deadline):
+            response = await client.chat.completions.create(**kwargs)
+    except APITimeoutError:
+        # A large batch outrunning its timeout says nothing about OpenAI's health
+        if not batch:
+            openai_breaker.record_failure()
+        raise
+    except TimeoutError as e:
+        if not batch:
+            openai_breaker.record_failure()
+        raise TimeoutError(f"OpenAI did not answer within {deadline:.0f} seconds") from e
+    except TRANSIENT_OPENAI_ERRORS:
+        openai_breaker.record_failure()
+        raise
+    openai_breaker.record_success()
+    return response
+
+# Static instructions shared by every request. Kept byte-for-byte identical and placed before the
+# per-request data so OpenAI's prompt caching can serve this prefix.
+SYSTEM_PROMPT = """You are a job matching AI assistant and career advisor that provides detailed analysis of job matches.
+The user message contains the JOB POSTING, YOUR PROFILE and MATCH RESULT data for the match to analyze.
+Fields that are not listed were not provided.
 
 MATCHING ALGORITHM COMPONENTS:
 1. Required Skills (30%): Job's Required Skills matched against your Technical Skills and Soft Skills (Character, Collaboration, Communication, Creativity, Critical Thinking, Fortitude, Growth Mindset, Leadership, Mindfulness) and Other Skills
@@ -152,8 +304,8 @@ MATCHING ALGORITHM COMPONENTS:
 7. Role (5%): Job's Role matched against your Job Titles
 8. Location (5%): Job's Location matched against your City
 
-Based on the above information and matching algorithm, provide a detailed explanation of:
-1. Why your profile received a {match_percentage}% match score for this job
+Based on the provided data and matching algorithm, provide a detailed explanation of:
+1. Why your profile received its match percentage for this job
 2. Identify the strongest matching areas between your profile and the job
 3. Identify skills or qualifications gaps you should work on to improve your match percentage
 4. Provide 3-5 specific, actionable recommendations for how you can improve your match score
@@ -164,74 +316,711 @@ Format your response as a JSON with these keys:
 - gaps: (array of strings) list of skill/qualification gaps
 - recommendations: (array of strings) list of actionable recommendations
 
-IMPORTANT: strengths, gaps, and recommendations MUST be arrays of strings, not single strings or other formats.
+Keep match_explanation under 150 words and each list item to one sentence.
+"""
+
+# Per-request data. The field sections are built by prompt_field_lines.
+USER_PROMPT_TEMPLATE = """JOB POSTING:
+{job_fields}
+
+YOUR PROFILE:
+{member_fields}
+
+MATCH RESULT:
+- Match Percentage: {match_percentage}%
 """
 
+# (label, payload key) for each job posting field included in the prompt
+JOB_PROMPT_FIELDS = (
+    ("Title", "JobTitle"),
+    ("Required Skills", "Required_Skills"),
+    ("Preferred Skills", "PreferredSkills"),
+    ("Qualifications", "Qualifications"),
+    ("Responsibilities", "Key_Responsibilities"),
+    ("Industry", "Industry"),
+    ("Role", "Role"),
+    ("Location", "JobLocation"),
+)
+
+# (label, payload key) for each member profile field included in the prompt
+MEMBER_PROMPT_FIELDS = (
+    ("Headline", "Headline"),
+    ("Technical Skills", "TechnicalSkillNames"),
+    ("Other Skills", "OtherSkills"),
+    ("Experience", "Experience"),
+    ("Job Titles", "JobTitles"),
+    ("Education", "Education"),
+    ("City", "CityName"),
+)
+
+# (category, payload key) for each soft skill category, folded into a single "Soft Skills" line
+SOFT_SKILL_FIELDS = (
+    ("Communication", "CommunicationNames"),
+    ("Leadership", "LeadershipNames"),
+    ("Critical Thinking", "CriticalThinkingNames"),
+    ("Collaboration", "CollaborationNames"),
+    ("Character", "CharacterNames"),
+    ("Creativity", "CreativityNames"),
+    ("Growth Mindset", "GrowthMindsetNames"),
+    ("Mindfulness", "MindfulnessNames"),
+    ("Fortitude", "FortitudeNames"),
+)
+
+# Member fields in the prompt, used to gauge how detailed a profile is
+MEMBER_PROMPT_KEYS = tuple(key for _, key in MEMBER_PROMPT_FIELDS + SOFT_SKILL_FIELDS)
+
+# Delimiters (and the whitespace around them) separating items in a delimited skill string
+_DELIMS = re.compile(r'\s*[\n;,]\s*')
+
+def is_empty_field(value):
+    """
+    Return whether a payload value carries no information for the prompt: missing, "N/A", or a list or
+    delimited string whose items are all blank
+    """
+    if value is None or value == {}:
+        return True
+    if isinstance(value, list):
+        return all(is_empty_field(item) for item in value)
+    if isinstance(value, str):
+        return all(part in ("", "N/A") for part in _DELIMS.split(value.strip()))
+    return False
+
+def format_skill_list(value):
+    """
+    Render a payload value for the prompt. Lists and delimited strings (skill lists arrive as either)
+    are joined with ", ", strings in a single split pass, dropping blank items and stray whitespace.
+    """
+    if isinstance(value, list):
+        return ", ".join(str(item).strip() for item in value if not is_empty_field(item))
+    if isinstance(value, str):
+        return ", ".join(part for part in _DELIMS.split(value.strip()) if part)
+    return str(value)
+
+def render_soft_skills(member_data):
+    """
+    Render the filled-in soft skill categories as one "Category=[skills]; ..." string, or "" if none are
+    """
+    return "; ".join(
+        f"{category}=[{format_skill_list(member_data[key])}]"
+        for category, key in SOFT_SKILL_FIELDS
+        if not is_empty_field(member_data.get(key))
+    )
+
+def prompt_field_lines(fields, data):
+    """
+    Build "- Label: value" lines for the fields that are filled in, skipping empty ones to save tokens
+    """
+    return [f"- {label}: {format_skill_list(data[key])}" for label, key in fields if not is_empty_field(data.get(key))]
+
+def render_prompt_section(lines):
+    """
+    Join the lines of a prompt section
+    """
+    return "\n".join(lines) or "- None provided"
+
+class Analysis(BaseModel):
+    """
+    Analysis of one job match. Also sent to OpenAI as the structured-output schema.
+    """
+    # The schema description is written for the model; without it pydantic would send this docstring
+    model_config = ConfigDict(
+        extra="forbid",
+        json_schema_extra={"description": "Analysis of how well the candidate's profile fits the job posting"}
+    )
+
+    match_explanation: str
+    strengths: list[str]
+    gaps: list[str]
+    recommendations: list[str]
+
+class AnalysisBatch(BaseModel):
+    """
+    Analyses of several job matches, one per match in the order they were given
+    """
+    model_config = ConfigDict(
+        extra="forbid",
+        json_schema_extra={"description": "One analysis per job match, in the order the matches were given"}
+    )
+
+    analyses: list[Analysis]
+
+def json_schema_response_format(model):
+    """
+    Build a strict structured-output response_format from a pydantic model
+    """
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": model.__name__, "schema": model.model_json_schema(), "strict": True}
+    }
+
+ANALYSIS_RESPONSE_FORMAT = json_schema_response_format(Analysis)
+ANALYSIS_BATCH_RESPONSE_FORMAT = json_schema_response_format(AnalysisBatch)
+
+class MatchData(BaseModel):
+    """
+    The "data" object of an analysis request
+    """
+    member: dict[str, Any] = Field(min_length=1)
+    jobpost: dict[str, Any] = Field(min_length=1)
+    Matching_Percentage: Union[int, float] = Field(0, ge=0, le=100)
+
+class MatchRequest(BaseModel):
+    """
+    Body of an analysis request
+    """
+    data: MatchData
+
+def load_token_encoding():
+    """
+    Load the tokenizer used by the gpt-4o model family into _token_encoding.
+    tiktoken may download the BPE file with a blocking request that has no timeout (unless it is
+    already in TIKTOKEN_CACHE_DIR), so this runs on a background thread, never on the event loop.
+    """
+    global _token_encoding
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are a job matching AI assistant that provides detailed analysis of job matches."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.5,
-            max_tokens=1500,
-            response_format={"type": "json_object"}
-        )
-        
-        # Parse the response
-        try:
-            analysis_text = response.choices[0].message.content
-            analysis = json.loads(analysis_text)
-            return normalize_analysis_response(analysis)
-        except json.JSONDecodeError:
-            # If response is not valid JSON, return it as plain text with correct format
-            return normalize_analysis_response({
-                "match_explanation": response.choices[0].message.content,
-                "strengths": [],
-                "gaps": [],
-                "recommendations": []
-            })
+        _token_encoding = tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        print(f"WARNING: could not load tiktoken encoding, falling back to a length estimate: {str(e)}")
+
+def estimate_prompt_tokens(prompt):
+    """
+    Count the tokens in a prompt, estimating roughly 4 characters per token until the tokenizer is loaded
+    """
+    if _token_encoding is None:
+        return len(prompt) // 4
+    return len(_token_encoding.encode(prompt))
+
+def validate_match_request(data):
+    """
+    Validate an analysis request before any OpenAI call is made.
+    Returns (normalized payload, rendered user prompt, None) on success or (None, None, error response) otherwise.
+    """
+    try:
+        payload = MatchRequest.model_validate(data).model_dump()
+    except ValidationError as e:
+        return None, None, (jsonify({
+            "error": "Invalid data format.",
+            "details": e.errors(include_url=False, include_context=False, include_input=False)
+        }), 400)
+
+    prompt = build_user_prompt(*extract_match_inputs(payload))
+    prompt_tokens = estimate_prompt_tokens(prompt)
+    if prompt_tokens > MAX_PROMPT_TOKENS:
+        return None, None, (jsonify({
+            "error": f"Input too large: the prompt would use {prompt_tokens} tokens, the limit is {MAX_PROMPT_TOKENS}."
+        }), 413)
+
+    return payload, prompt, None
+
+def extract_match_inputs(data):
+    """
+    Pull the member, job posting and match percentage out of a request payload
+    """
+    member_data = data.get("data", {}).get("member", {})
+    job_data = data.get("data", {}).get("jobpost", {})
+    match_percentage = data.get("data", {}).get("Matching_Percentage", 0)
+    return member_data, job_data, match_percentage
+
+def build_user_prompt(member_data, job_data, match_percentage):
+    """
+    Render the per-request part of the prompt
+    """
+    # Only the per-request data goes here, after the static SYSTEM_PROMPT, so OpenAI's prompt cache
+    # can reuse the shared prefix.
+    member_lines = prompt_field_lines(MEMBER_PROMPT_FIELDS, member_data)
+    soft_skills = render_soft_skills(member_data)
+    if soft_skills:
+        member_lines.append(f"- Soft Skills: {soft_skills}")
+
+    return USER_PROMPT_TEMPLATE.format(
+        job_fields=render_prompt_section(prompt_field_lines(JOB_PROMPT_FIELDS, job_data)),
+        member_fields=render_prompt_section(member_lines),
+        match_percentage=match_percentage
+    )
+
+def needs_deep_reasoning(member_data, match_percentage):
+    """
+    Decide whether a match is complex enough to need the stronger model: the match percentage
+    falls in the ambiguous middle band, or the profile fills in most of the prompt fields
+    """
+    try:
+        percentage = float(match_percentage)
+    except (TypeError, ValueError):
+        return True
+    if AMBIGUOUS_MATCH_RANGE[0] <= percentage <= AMBIGUOUS_MATCH_RANGE[1]:
+        return True
+
+    filled = sum(1 for key in MEMBER_PROMPT_KEYS if not is_empty_field(member_data.get(key)))
+    return filled >= DETAILED_PROFILE_FIELDS
+
+def select_model(member_data, match_percentage):
+    """
+    Pick the chat model for a match
+    """
+    if needs_deep_reasoning(member_data, match_percentage):
+        return DEEP_REASONING_MODEL
+    return DEFAULT_MODEL
+
+def record_completion_usage(usage, analyses=1):
+    """
+    Record the completion tokens an OpenAI call used, split evenly across the analyses it produced
+    """
+    if usage is not None and usage.completion_tokens:
+        _completion_token_samples.append(usage.completion_tokens / analyses)
+
+def completion_token_cap():
+    """
+    Return the max_tokens to request per analysis, tuned to the p95 of recent completion sizes
+    """
+    if len(_completion_token_samples) < COMPLETION_TOKENS_MIN_SAMPLES:
+        return MAX_COMPLETION_TOKENS
+    p95 = float(np.percentile(_completion_token_samples, 95))
+    return int(min(max(p95 * COMPLETION_TOKENS_HEADROOM, MIN_COMPLETION_TOKENS), COMPLETION_TOKENS_CEILING))
+
+def build_completion_request(prompt, model, max_tokens=None):
+    """
+    Build the chat completion arguments for a user prompt, capped at max_tokens or the tuned cap
+    """
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.5,
+        "max_tokens": max_tokens or completion_token_cap(),
+        "response_format": ANALYSIS_RESPONSE_FORMAT
+    }
+
+async def find_semantic_match(cache_key, prompt, scope):
+    """
+    Look up a near-duplicate analysis within scope in the semantic cache.
+    Returns (analysis or None, prompt embedding or None).
+    """
+    if not SEMANTIC_CACHE_ENABLED:
+        return None, None
+    try:
+        embedding = await embed_prompt(prompt)
+        cached = find_similar_analysis(embedding, scope)
+        if cached is not None:
+            store_cached_analysis(cache_key, cached)
+        return cached, embedding
+    except Exception as e:
+        print(f"WARNING: semantic cache lookup failed: {str(e)}")
+        return None, None
+
+def message_text(message):
+    """
+    Return the content of a completion message, raising if the model refused to answer
+    """
+    if getattr(message, "refusal", None):
+        raise ValueError(f"OpenAI refused the request: {message.refusal}")
+    return message.content
+
+def parse_analysis(analysis_text):
+    """
+    Parse the model's structured output into an analysis dict
+    """
+    return Analysis.model_validate_json(analysis_text).model_dump()
+
+async def analyze_job_match(data, prompt):
+    """
+    Use OpenAI to analyze the job match and provide an explanation.
+    prompt is the user prompt already rendered for data by validate_match_request.
+    """
+    # Format the input data for the prompt
+    member_data, job_data, match_percentage = extract_match_inputs(data)
+
+    # Serve repeated requests from the cache
+    cache_key = make_cache_key(member_data, job_data, match_percentage)
+    cached = get_cached_analysis(cache_key)
+    if cached is not None:
+        return cached
+
+    # Identical requests already in flight share one analysis
+    return await single_flight(
+        cache_key,
+        lambda: compute_job_match_analysis(cache_key, prompt, member_data, match_percentage)
+    )
+
+async def compute_job_match_analysis(cache_key, prompt, member_data, match_percentage):
+    """
+    Produce and cache the analysis for a match that missed the exact-match cache
+    """
+    model = select_model(member_data, match_percentage)
+    scope = semantic_scope(match_percentage, model)
+
+    # Serve near-duplicate requests from the semantic cache
+    cached, embedding = await find_semantic_match(cache_key, prompt, scope)
+    if cached is not None:
+        return cached
+
+    try:
+        analysis = await request_analysis(prompt, model)
+        store_cached_analysis(cache_key, analysis, embedding, scope)
+        return analysis
             
     except Exception as e:
         return {"error": f"Error analyzing job match: {str(e)}"}
 
+def start_flight(key, factory):
+    """
+    Return the task computing key, starting factory() as that task if none is in flight yet
+    """
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(factory())
+        _inflight[key] = task
+        task.add_done_callback(lambda done: _inflight.pop(key, None) if _inflight.get(key) is done else None)
+    return task
+
+async def single_flight(key, factory):
+    """
+    Run factory() at most once at a time per key; concurrent callers with the same key await the same task.
+    The task is shielded so it still completes, and caches its result, if the first caller disconnects.
+    """
+    return await asyncio.shield(start_flight(key, factory))
+
+def was_truncated(finish_reason, request_args):
+    """
+    Whether a completion was cut off by a max_tokens below COMPLETION_TOKENS_CEILING, so a retry can finish it
+    """
+    return finish_reason == "length" and request_args["max_tokens"] < COMPLETION_TOKENS_CEILING
+
+async def complete_analysis(prompt, model, max_tokens=None):
+    """
+    Run a single analysis through OpenAI, retrying once at COMPLETION_TOKENS_CEILING if the tuned cap cut it off
+    """
+    request_args = build_completion_request(prompt, model, max_tokens)
+    response = await create_chat_completion(**request_args)
+    record_completion_usage(response.usage)
+    choice = response.choices[0]
+    if was_truncated(choice.finish_reason, request_args):
+        return await complete_analysis(prompt, model, COMPLETION_TOKENS_CEILING)
+    return parse_analysis(message_text(choice.message))
+
+async def request_analysis(prompt, model):
+    """
+    Get the analysis for a prompt, going through the micro-batcher while it is running
+    """
+    if _batch_queue is None:
+        return await complete_analysis(prompt, model)
+    future = asyncio.get_running_loop().create_future()
+    await _batch_queue.put((prompt, model, future))
+    return await future
+
+def build_batch_prompt(prompts):
+    """
+    Combine several user prompts into one request for a JSON array of analyses
+    """
+    sections = [f"=== MATCH {i} ===\n{prompt}" for i, prompt in enumerate(prompts, start=1)]
+    return (
+        f"Analyze each of the following {len(prompts)} job matches independently.\n"
+        f"Respond with a JSON object with a single key \"analyses\": an array of exactly {len(prompts)} "
+        "analysis objects, in the same order as the matches, each with the keys described above.\n\n"
+        + "\n".join(sections)
+    )
+
+async def dispatch_batch(model, items):
+    """
+    Send a batch of (prompt, future) items to OpenAI and resolve each future with its analysis
+    """
+    try:
+        if len(items) == 1:
+            results = [await complete_analysis(items[0][0], model)]
+        else:
+            request_args = build_completion_request(build_batch_prompt([prompt for prompt, _ in items]), model)
+            request_args["max_tokens"] = min(request_args["max_tokens"] * len(items), MAX_OUTPUT_TOKENS)
+            request_args["response_format"] = ANALYSIS_BATCH_RESPONSE_FORMAT
+            try:
+                response = await create_chat_completion(batch=True, **request_args)
+                record_completion_usage(response.usage, len(items))
+                analyses = AnalysisBatch.model_validate_json(message_text(response.choices[0].message)).analyses
+            except Exception as e:
+                print(f"WARNING: batched analysis failed, falling back to one call per request: {str(e)}")
+                analyses = None
+
+            if analyses is not None and len(analyses) == len(items):
+                results = [analysis.model_dump() for analysis in analyses]
+            else:
+                # The batch failed or its answer could not be matched back to its requests, so run them one by one
+                results = await asyncio.gather(
+                    *(complete_analysis(prompt, model) for prompt, _ in items),
+                    return_exceptions=True
+                )
+
+        for (_, future), result in zip(items, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+    except Exception as e:
+        for _, future in items:
+            if not future.done():
+                future.set_exception(e)
+
+def dispatch_queued(batch):
+    """
+    Dispatch queued (prompt, model, future) items as one batch per model, skipping callers that gave up
+    """
+    by_model = {}
+    for prompt, model, future in batch:
+        if not future.done():
+            by_model.setdefault(model, []).append((prompt, future))
+    for model, items in by_model.items():
+        task = asyncio.create_task(dispatch_batch(model, items))
+        _batch_tasks.add(task)
+        task.add_done_callback(_batch_tasks.discard)
+
+async def run_batcher():
+    """
+    Collect queued analyses into batches of up to MAX_BATCH_SIZE, waiting at most BATCH_WAIT_MS
+    after the first one, and dispatch each batch grouped by model
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await _batch_queue.get()]
+        deadline = loop.time() + BATCH_WAIT_MS / 1000
+        try:
+            while len(batch) < MAX_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(_batch_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+        finally:
+            # Also runs when the batcher is stopped mid-collection, so those items are not dropped
+            dispatch_queued(batch)
+
+def partial_match_explanation(analysis_text):
+    """
+    Extract the match_explanation generated so far from an incomplete JSON response.
+    Returns (explanation, complete); it is complete once the model has moved on to a later key.
+    """
+    try:
+        partial = jiter.from_json(analysis_text.encode("utf-8"), partial_mode="trailing-strings")
+    except ValueError:
+        return "", False
+    if isinstance(partial, dict) and isinstance(partial.get("match_explanation"), str):
+        return partial["match_explanation"], len(partial) > 1
+    return "", False
+
+def format_sse(event, payload):
+    """
+    Format a server-sent event with a JSON payload
+    """
+    return f"event: {event}\ndata: {orjson.dumps(payload).decode('utf-8')}\n\n"
+
+async def compute_streamed_analysis(cache_key, prompt, member_data, match_percentage, deltas):
+    """
+    Produce and cache the analysis for a match like compute_job_match_analysis, but stream the completion,
+    putting each new piece of match_explanation on the deltas queue and None once the analysis is done
+    """
+    try:
+        model = select_model(member_data, match_percentage)
+        scope = semantic_scope(match_percentage, model)
+        cached, embedding = await find_semantic_match(cache_key, prompt, scope)
+        if cached is not None:
+            return cached
+
+        try:
+            request_args = build_completion_request(prompt, model)
+            stream = await create_chat_completion(
+                **request_args,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            analysis_text = ""
+            sent = 0
+            explanation_complete = False
+            finish_reason = None
+            try:
+                # Closes the upstream response however the iteration ends
+                async with stream:
+                    async for chunk in stream:
+                        # The final chunk carries usage and no choices
+                        if chunk.usage is not None:
+                            record_completion_usage(chunk.usage)
+                        if not chunk.choices:
+                            continue
+                        choice = chunk.choices[0]
+                        finish_reason = choice.finish_reason or finish_reason
+                        if not choice.delta.content:
+                            continue
+                        analysis_text += choice.delta.content
+
+                        # Forward only the part of match_explanation not sent yet. Stop parsing the growing
+                        # buffer once it is complete: the rest of the answer only reaches the result event.
+                        if explanation_complete:
+                            continue
+                        explanation, explanation_complete = partial_match_explanation(analysis_text)
+                        if len(explanation) > sent:
+                            deltas.put_nowait(explanation[sent:])
+                            sent = len(explanation)
+            except TRANSIENT_OPENAI_ERRORS + (httpx.TransportError,):
+                openai_breaker.record_failure()
+                raise
+
+            if was_truncated(finish_reason, request_args):
+                # The tuned cap cut the answer off: fetch it whole, superseding the explanation streamed so far
+                analysis = await complete_analysis(prompt, model, COMPLETION_TOKENS_CEILING)
+            else:
+                analysis = parse_analysis(analysis_text)
+            store_cached_analysis(cache_key, analysis, embedding, scope)
+            return analysis
+        except Exception as e:
+            return {"error": f"Error analyzing job match: {str(e)}"}
+    finally:
+        deltas.put_nowait(None)
+
+async def stream_job_match(data, prompt):
+    """
+    Stream the job match analysis as server-sent events.
+    Yields "explanation" events carrying match_explanation deltas as they are generated,
+    then one "result" event with the same payload as /analyze_job_match. The result is authoritative:
+    if a cut-off answer had to be retried, its match_explanation replaces the streamed one.
+    """
+    member_data, job_data, match_percentage = extract_match_inputs(data)
+
+    cache_key = make_cache_key(member_data, job_data, match_percentage)
+    analysis = get_cached_analysis(cache_key)
+
+    if analysis is None:
+        flight = _inflight.get(cache_key)
+        if flight is None:
+            # Register the streamed call as the in-flight analysis, so identical requests (streamed or not)
+            # wait for it. It runs as its own task: if this client disconnects it still finishes and caches.
+            deltas = asyncio.Queue()
+            flight = start_flight(
+                cache_key,
+                lambda: compute_streamed_analysis(cache_key, prompt, member_data, match_percentage, deltas)
+            )
+            while (delta := await deltas.get()) is not None:
+                yield format_sse("explanation", {"delta": delta})
+        # Otherwise an identical analysis is already in flight: wait for it rather than starting another
+        analysis = await asyncio.shield(flight)
+
+    yield format_sse("result", build_match_response(data, analysis))
+
+def build_match_response(data, analysis):
+    """
+    Build the response body returned to the client
+    """
+    # Return only the analysis and matching percentage
+    return {
+        "status": "success",
+        "data": {
+            "Matching_Percentage": data.get("data", {}).get("Matching_Percentage", 0),
+            "analysis": analysis
+        }
+    }
+
+@app.before_serving
+async def start_batcher():
+    """
+    Load the tokenizer and start the micro-batcher when the server starts
+    """
+    global _batch_queue, _batcher_task
+    # Load the tokenizer off the event loop; prompt sizes are estimated from their length until it is ready
+    threading.Thread(target=load_token_encoding, name="tiktoken-loader", daemon=True).start()
+
+    if BATCHING_ENABLED and MAX_BATCH_SIZE > 1:
+        _batch_queue = asyncio.Queue()
+        _batcher_task = asyncio.create_task(run_batcher())
+
+async def stop_batcher():
+    """
+    Stop the micro-batcher, then dispatch whatever is still queued and wait for all batches to finish
+    """
+    global _batch_queue, _batcher_task
+    if _batcher_task is None:
+        return
+    queue, task = _batch_queue, _batcher_task
+    # New analyses bypass the batcher from here on
+    _batch_queue = None
+    _batcher_task = None
+
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    pending = []
+    while not queue.empty():
+        pending.append(queue.get_nowait())
+    dispatch_queued(pending)
+    await asyncio.gather(*_batch_tasks, return_exceptions=True)
+
+@app.after_serving
+async def close_http_client():
+    """
+    Stop the micro-batcher and close the shared connection pool when the server shuts down
+    """
+    await stop_batcher()
+    await http_client.aclose()
+
 @app.route('/analyze_job_match', methods=['POST'])
-def analyze_match():
+async def analyze_match():
     """
     API endpoint to analyze job match data and provide an explanation
     """
     try:
-        # Get the data from the request
-        data = request.json
+        # Get the data from the request; a body that is not valid JSON comes back as None
+        data = await request.get_json(silent=True)
         
         # Make sure required data is present
-        if not data or "data" not in data:
+        if not isinstance(data, dict) or "data" not in data:
             return jsonify({"error": "Invalid data format. Missing 'data' field."}), 400
+
+        # Reject malformed or oversized payloads before spending an OpenAI call on them
+        data, prompt, error = validate_match_request(data)
+        if error is not None:
+            return error
             
         # Get the analysis
-        analysis = analyze_job_match(data)
+        analysis = await analyze_job_match(data, prompt)
         
-        # Return only the analysis and matching percentage
-        response = {
-            "status": "success",
-            "data": {
-                "Matching_Percentage": data.get("data", {}).get("Matching_Percentage", 0),
-                "analysis": analysis
-            }
-        }
+        response = build_match_response(data, analysis)
+        return app.response_class(orjson.dumps(response), mimetype='application/json')
         
-        return jsonify(response)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/analyze_job_match/stream', methods=['POST'])
+async def analyze_match_stream():
+    """
+    API endpoint to analyze job match data, streaming the explanation as server-sent events
+    """
+    try:
+        # Get the data from the request; a body that is not valid JSON comes back as None
+        data = await request.get_json(silent=True)
+        
+        # Make sure required data is present
+        if not isinstance(data, dict) or "data" not in data:
+            return jsonify({"error": "Invalid data format. Missing 'data' field."}), 400
+
+        # Reject malformed or oversized payloads before spending an OpenAI call on them
+        data, prompt, error = validate_match_request(data)
+        if error is not None:
+            return error
+
+        response = app.response_class(stream_job_match(data, prompt), mimetype='text/event-stream')
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["X-Accel-Buffering"] = "no"
+        # Generation can outlast the default response timeout
+        response.timeout = None
+        return response
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
-    # Check if API key is set
-    if not openai_api_key:
-        print("\nWARNING: OPENAI_API_KEY not set in environment variables!")
-        print("To set it, run: export OPENAI_API_KEY=your_api_key_here\n")
-    
-    # Run the Flask app
+    # Run the Quart app under Hypercorn with one worker per core (see hypercorn_config.py)
     # app.run(host="127.0.0.1", port=7001, debug=True)
-    app.run(host="0.0.0.0", port=8000, debug=True)
+    config = Config.from_pyfile(os.path.join(os.path.dirname(os.path.abspath(__file__)), "hypercorn_config.py"))
+    config.application_path = "app:app"
+    sys.exit(run(config))
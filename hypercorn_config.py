@@ -0,0 +1,49 @@
+"""
+Hypercorn settings for serving the app in production. Used by `python app.py`, or directly with:
+
+    hypercorn -c file:hypercorn_config.py app:app
+"""
+import math
+import os
+
+# Default cap on workers: each one keeps its own caches and connection pool, and the work is I/O-bound
+MAX_DEFAULT_WORKERS = 4
+
+def available_cpus():
+    """
+    Return the CPUs this process may use: the cgroup CPU quota when one is set, else the CPU affinity mask
+    """
+    try:
+        # cgroup v2: "<quota> <period>", or "max <period>" when unlimited
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return max(1, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        try:
+            # cgroup v1: a quota of -1 means unlimited
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                quota = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if quota > 0:
+                return max(1, math.ceil(quota / period))
+        except (OSError, ValueError):
+            pass
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+bind = [f"0.0.0.0:{os.getenv('PORT', '8000')}"]
+
+# One asyncio worker per available CPU, up to MAX_DEFAULT_WORKERS; each worker serves many concurrent
+# analyses on its own event loop. WEB_CONCURRENCY overrides the default.
+workers = int(os.getenv("WEB_CONCURRENCY", min(available_cpus(), MAX_DEFAULT_WORKERS)))
+worker_class = "asyncio"
+
+# Keep client connections open between requests and give in-flight analyses time to finish on shutdown
+keep_alive_timeout = 75
+graceful_timeout = 30
+
+accesslog = "-"
+errorlog = "-"
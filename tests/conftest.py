@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# app.py exits at import without an API key; the tests never reach OpenAI
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def reset_app_state():
+    """
+    Start every test with empty caches, nothing in flight and the default token cap
+    """
+    for state in (app._analysis_cache, app._semantic_entries, app._inflight, app._completion_token_samples):
+        state.clear()
+    yield
@@ -0,0 +1,108 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import app
+
+
+def analysis(name):
+    return {"match_explanation": name, "strengths": [], "gaps": [], "recommendations": []}
+
+
+def completion(payload):
+    return SimpleNamespace(
+        usage=SimpleNamespace(completion_tokens=10),
+        choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps(payload), refusal=None), finish_reason="stop")]
+    )
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    """
+    Replace create_chat_completion; batched calls answer with batch_reply(prompts), single calls echo their prompt
+    """
+    calls = []
+    state = SimpleNamespace(calls=calls, batch_reply=lambda prompts: [analysis(p) for p in prompts])
+
+    async def create_chat_completion(batch=False, **kwargs):
+        prompt = kwargs["messages"][-1]["content"]
+        calls.append("batch" if batch else prompt)
+        if batch:
+            prompts = [section.split("\n", 1)[1].strip() for section in prompt.split("=== MATCH ")[1:]]
+            return completion({"analyses": state.batch_reply(prompts)})
+        return completion(analysis(prompt))
+
+    monkeypatch.setattr(app, "create_chat_completion", create_chat_completion)
+    return state
+
+
+def items(loop, *prompts):
+    return [(prompt, loop.create_future()) for prompt in prompts]
+
+
+def test_batch_fans_results_out_in_order(fake_openai):
+    async def run():
+        batch = items(asyncio.get_running_loop(), "p1", "p2", "p3")
+        await app.dispatch_batch("gpt-4o-mini", batch)
+        return [future.result()["match_explanation"] for _, future in batch]
+
+    assert asyncio.run(run()) == ["p1", "p2", "p3"]
+    assert fake_openai.calls == ["batch"]
+
+
+def test_count_mismatch_falls_back_to_single_calls(fake_openai):
+    fake_openai.batch_reply = lambda prompts: [analysis(p) for p in prompts[:-1]]
+
+    async def run():
+        batch = items(asyncio.get_running_loop(), "p1", "p2", "p3")
+        await app.dispatch_batch("gpt-4o-mini", batch)
+        return [future.result()["match_explanation"] for _, future in batch]
+
+    assert asyncio.run(run()) == ["p1", "p2", "p3"]
+    assert fake_openai.calls == ["batch", "p1", "p2", "p3"]
+
+
+def test_cancelled_futures_are_skipped(fake_openai):
+    async def run():
+        batch = items(asyncio.get_running_loop(), "p1", "p2")
+        batch[0][1].cancel()
+        await app.dispatch_batch("gpt-4o-mini", batch)
+
+        # Callers that gave up before dispatch are not sent at all
+        gone = items(asyncio.get_running_loop(), "p3")
+        gone[0][1].cancel()
+        app.dispatch_queued([(prompt, "gpt-4o-mini", future) for prompt, future in gone])
+        await asyncio.gather(*app._batch_tasks)
+        return batch
+
+    batch = asyncio.run(run())
+    assert batch[0][1].cancelled()
+    assert batch[1][1].result()["match_explanation"] == "p2"
+    assert fake_openai.calls == ["batch"]
+
+
+@pytest.mark.parametrize("collecting", [False, True])
+def test_shutdown_dispatches_queued_items(fake_openai, monkeypatch, collecting):
+    monkeypatch.setattr(app, "BATCH_WAIT_MS", 60_000)
+
+    async def run():
+        queue = asyncio.Queue()
+        monkeypatch.setattr(app, "_batch_queue", queue)
+        batch = items(asyncio.get_running_loop(), "p1", "p2")
+        for prompt, future in batch:
+            queue.put_nowait((prompt, "gpt-4o-mini", future))
+        monkeypatch.setattr(app, "_batcher_task", asyncio.create_task(app.run_batcher()))
+        if collecting:
+            # Let the batcher take the items and start waiting for more
+            for _ in range(5):
+                await asyncio.sleep(0)
+        assert queue.empty() == collecting
+        await app.stop_batcher()
+        return await asyncio.wait_for(asyncio.gather(*(future for _, future in batch)), 1)
+
+    results = asyncio.run(run())
+    assert [result["match_explanation"] for result in results] == ["p1", "p2"]
+    assert fake_openai.calls == ["batch"]
+    assert app._batch_queue is None and app._batcher_task is None
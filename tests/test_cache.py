@@ -0,0 +1,51 @@
+import numpy as np
+
+import app
+
+
+def analysis(name):
+    return {"match_explanation": name, "strengths": [], "gaps": [], "recommendations": []}
+
+
+def unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_cache_key_is_independent_of_key_order():
+    first = app.make_cache_key({"a": 1, "b": 2}, {"JobTitle": "Eng"}, 72)
+    second = app.make_cache_key({"b": 2, "a": 1}, {"JobTitle": "Eng"}, 72)
+    assert first == second
+
+
+def test_cache_key_accepts_integers_beyond_64_bits():
+    big = 2 ** 64 + 1
+    key = app.make_cache_key({"Id": big}, {"JobTitle": "Eng"}, 72)
+    assert key == app.make_cache_key({"Id": big}, {"JobTitle": "Eng"}, 72)
+    assert key != app.make_cache_key({"Id": big + 1}, {"JobTitle": "Eng"}, 72)
+
+
+def test_cached_analysis_round_trips():
+    app.store_cached_analysis("key", analysis("cached"))
+    assert app.get_cached_analysis("key") == analysis("cached")
+    assert app.get_cached_analysis("other") is None
+
+
+def test_semantic_lookup_stays_within_its_scope():
+    scope = app.semantic_scope(72, "gpt-4o-mini")
+    app.store_cached_analysis("key", analysis("cached"), unit(1, 0), scope)
+
+    assert app.find_similar_analysis(unit(1, 0), scope) == analysis("cached")
+    assert app.find_similar_analysis(unit(1, 0), app.semantic_scope(73, "gpt-4o-mini")) is None
+    assert app.find_similar_analysis(unit(1, 0), app.semantic_scope(72, "gpt-4o")) is None
+    assert app.find_similar_analysis(unit(0, 1), scope) is None
+
+
+def test_semantic_entry_is_replaced_per_key():
+    scope = app.semantic_scope(72, "gpt-4o-mini")
+    app.store_cached_analysis("key", analysis("first"), unit(1, 0), scope)
+    app.store_cached_analysis("key", analysis("second"), unit(0, 1), scope)
+
+    assert len(app._semantic_entries) == 1
+    assert app.find_similar_analysis(unit(1, 0), scope) is None
+    assert app.find_similar_analysis(unit(0, 1), scope) == analysis("second")
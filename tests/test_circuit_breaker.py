@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(app.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_opens_after_threshold_failures(clock):
+    breaker = app.CircuitBreaker(3, 30)
+    for _ in range(2):
+        breaker.record_failure()
+        assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+    assert breaker.retry_after() == 30
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = app.CircuitBreaker(3, 30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.allow()
+
+
+def test_half_open_lets_one_trial_through(clock):
+    breaker = app.CircuitBreaker(1, 30)
+    breaker.record_failure()
+    clock[0] += 30
+    assert breaker.allow()
+    # Everyone else waits for the trial's outcome
+    assert not breaker.allow()
+
+
+def test_failed_trial_reopens(clock):
+    breaker = app.CircuitBreaker(1, 30)
+    breaker.record_failure()
+    clock[0] += 30
+    assert breaker.allow()
+    clock[0] += 5
+    breaker.record_failure()
+    assert not breaker.allow()
+    assert breaker.retry_after() == 30
+
+
+def test_successful_trial_closes(clock):
+    breaker = app.CircuitBreaker(1, 30)
+    breaker.record_failure()
+    clock[0] += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.allow() and breaker.allow()
+    assert breaker.retry_after() == 0
+
+
+def test_open_breaker_fails_fast(monkeypatch):
+    breaker = app.CircuitBreaker(1, 30)
+    breaker.record_failure()
+    monkeypatch.setattr(app, "openai_breaker", breaker)
+
+    async def unexpected(**kwargs):
+        raise AssertionError("OpenAI was called while the breaker was open")
+
+    monkeypatch.setattr(app.openai_client.chat.completions, "create", unexpected)
+    with pytest.raises(app.CircuitOpenError):
+        asyncio.run(app.create_chat_completion(model="gpt-4o-mini", messages=[]))
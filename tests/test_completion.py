@@ -0,0 +1,219 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import AsyncOpenAI
+
+import app
+
+
+def analysis(name):
+    return {"match_explanation": name, "strengths": [], "gaps": [], "recommendations": []}
+
+
+def test_truncated_completion_is_retried_at_the_ceiling(monkeypatch):
+    caps = []
+
+    async def create_chat_completion(batch=False, **kwargs):
+        caps.append(kwargs["max_tokens"])
+        truncated = kwargs["max_tokens"] < app.COMPLETION_TOKENS_CEILING
+        content = '{"match_explanation": "cut' if truncated else json.dumps(analysis("whole"))
+        return SimpleNamespace(
+            usage=SimpleNamespace(completion_tokens=kwargs["max_tokens"]),
+            choices=[SimpleNamespace(
+                message=SimpleNamespace(content=content, refusal=None),
+                finish_reason="length" if truncated else "stop"
+            )]
+        )
+
+    monkeypatch.setattr(app, "create_chat_completion", create_chat_completion)
+    result = asyncio.run(app.complete_analysis("prompt", "gpt-4o-mini"))
+    assert result["match_explanation"] == "whole"
+    assert caps == [app.MAX_COMPLETION_TOKENS, app.COMPLETION_TOKENS_CEILING]
+
+
+class FakeStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.closed = True
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def stream_chunk(content, finish_reason=None):
+    return SimpleNamespace(
+        usage=None,
+        choices=[SimpleNamespace(delta=SimpleNamespace(content=content), finish_reason=finish_reason)]
+    )
+
+
+def test_truncated_stream_is_retried_at_the_ceiling(monkeypatch):
+    calls = []
+    streams = []
+
+    async def create_chat_completion(batch=False, **kwargs):
+        calls.append((kwargs.get("stream", False), kwargs["max_tokens"]))
+        if kwargs.get("stream"):
+            stream = FakeStream([stream_chunk('{"match_explanation": "cut'), stream_chunk("", "length")])
+            streams.append(stream)
+            return stream
+        return SimpleNamespace(
+            usage=None,
+            choices=[SimpleNamespace(
+                message=SimpleNamespace(content=json.dumps(analysis("whole")), refusal=None),
+                finish_reason="stop"
+            )]
+        )
+
+    monkeypatch.setattr(app, "create_chat_completion", create_chat_completion)
+
+    async def run():
+        deltas = asyncio.Queue()
+        result = await app.compute_streamed_analysis("truncated-stream", "prompt", {}, 90, deltas)
+        sent = []
+        while (delta := deltas.get_nowait()) is not None:
+            sent.append(delta)
+        return result, sent
+
+    result, sent = asyncio.run(run())
+    assert sent == ["cut"]
+    assert result["match_explanation"] == "whole"
+    assert calls == [(True, app.MAX_COMPLETION_TOKENS), (False, app.COMPLETION_TOKENS_CEILING)]
+    assert streams[0].closed
+
+
+def test_timed_out_completion_is_not_retried_past_the_deadline(monkeypatch):
+    attempts = []
+
+    async def never_answer(request):
+        attempts.append(request)
+        await asyncio.sleep(60)
+
+    async def run():
+        client = AsyncOpenAI(
+            api_key="sk-test",
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(never_answer)),
+            max_retries=2
+        )
+        monkeypatch.setattr(app, "openai_client", client)
+        monkeypatch.setattr(app, "openai_breaker", app.CircuitBreaker(5, 30))
+        monkeypatch.setattr(app, "OPENAI_RETRY_BUDGET", 0.1)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        with pytest.raises(TimeoutError):
+            await app.create_chat_completion(model="gpt-4o-mini", messages=[], max_tokens=10, timeout=0.2)
+        return loop.time() - started
+
+    assert asyncio.run(run()) < 1
+    assert len(attempts) == 1
+    assert app.openai_breaker._failures == 1
+
+
+@pytest.fixture
+def slow_openai(monkeypatch):
+    """
+    Count OpenAI calls in calls.kinds; each answers after a short delay so identical requests overlap,
+    and calls.started is set once the first one is made
+    """
+    calls = SimpleNamespace(kinds=[], started=None)
+
+    async def create_chat_completion(batch=False, **kwargs):
+        calls.kinds.append(kwargs.get("stream", False))
+        calls.started.set()
+        await asyncio.sleep(0.05)
+        content = json.dumps(analysis("shared"))
+        if kwargs.get("stream"):
+            return FakeStream([stream_chunk(content[i:i + 8]) for i in range(0, len(content), 8)])
+        return SimpleNamespace(
+            usage=None,
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content, refusal=None), finish_reason="stop")]
+        )
+
+    monkeypatch.setattr(app, "create_chat_completion", create_chat_completion)
+    return calls
+
+
+MATCH_BODY = {"data": {"member": {"Headline": "Developer"}, "jobpost": {"JobTitle": "Engineer"}, "Matching_Percentage": 85}}
+
+
+async def post(client, path):
+    response = await client.post(path, json=MATCH_BODY)
+    return (await response.get_data()).decode("utf-8")
+
+
+def test_identical_requests_share_one_call(slow_openai):
+    async def run():
+        slow_openai.started = asyncio.Event()
+        client = app.app.test_client()
+        return await asyncio.gather(*(post(client, "/analyze_job_match") for _ in range(4)))
+
+    bodies = asyncio.run(run())
+    assert all('"shared"' in body for body in bodies)
+    assert slow_openai.kinds == [False]
+
+
+def test_identical_streamed_and_plain_requests_share_one_call(slow_openai):
+    async def run():
+        slow_openai.started = asyncio.Event()
+        client = app.app.test_client()
+        # The streamed request calls OpenAI first; the others arrive while that call is in progress
+        streamed = asyncio.create_task(post(client, "/analyze_job_match/stream"))
+        await slow_openai.started.wait()
+        return await asyncio.gather(
+            streamed, post(client, "/analyze_job_match/stream"), post(client, "/analyze_job_match")
+        )
+
+    first, second, plain = asyncio.run(run())
+    assert "event: explanation" in first and "event: result" in first
+    assert "event: result" in second and '"shared"' in second
+    assert '"shared"' in plain
+    assert slow_openai.kinds == [True]
+
+
+def test_schema_descriptions_are_written_for_the_model():
+    for response_format, model in ((app.ANALYSIS_RESPONSE_FORMAT, app.Analysis),
+                                   (app.ANALYSIS_BATCH_RESPONSE_FORMAT, app.AnalysisBatch)):
+        schema = json.dumps(response_format)
+        assert model.__doc__.strip() not in schema
+        assert "OpenAI" not in schema
+
+
+def test_stream_stops_parsing_once_the_explanation_is_complete(monkeypatch):
+    content = json.dumps({"match_explanation": "Good fit.", "strengths": ["a"] * 50, "gaps": [], "recommendations": []})
+    chunks = [stream_chunk(content[i:i + 4]) for i in range(0, len(content), 4)]
+
+    async def create_chat_completion(batch=False, **kwargs):
+        return FakeStream(chunks)
+
+    parsed = []
+
+    def partial_match_explanation(analysis_text):
+        parsed.append(analysis_text)
+        return original(analysis_text)
+
+    original = app.partial_match_explanation
+    monkeypatch.setattr(app, "create_chat_completion", create_chat_completion)
+    monkeypatch.setattr(app, "partial_match_explanation", partial_match_explanation)
+
+    async def run():
+        deltas = asyncio.Queue()
+        result = await app.compute_streamed_analysis("stop-parsing", "prompt", {}, 90, deltas)
+        sent = []
+        while (delta := deltas.get_nowait()) is not None:
+            sent.append(delta)
+        return result, "".join(sent)
+
+    result, sent = asyncio.run(run())
+    assert sent == "Good fit."
+    assert len(result["strengths"]) == 50
+    assert all('"recommendations"' not in text for text in parsed)
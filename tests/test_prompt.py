@@ -0,0 +1,42 @@
+import app
+
+
+def test_list_fields_are_joined_not_repr():
+    prompt = app.build_user_prompt(
+        {"TechnicalSkillNames": ["Python", "SQL"], "JobTitles": "Developer;\nAnalyst"},
+        {"JobTitle": "Engineer", "Required_Skills": ["Python", "Docker"]},
+        72
+    )
+    assert "- Technical Skills: Python, SQL" in prompt
+    assert "- Job Titles: Developer, Analyst" in prompt
+    assert "- Required Skills: Python, Docker" in prompt
+    assert "[" not in prompt and "'" not in prompt
+
+
+def test_soft_skills_fold_into_one_line():
+    prompt = app.build_user_prompt(
+        {"CommunicationNames": ["Listening", "Writing"], "LeadershipNames": "Mentoring"},
+        {"JobTitle": "Engineer"},
+        72
+    )
+    assert "- Soft Skills: Communication=[Listening, Writing]; Leadership=[Mentoring]" in prompt
+
+
+def test_empty_fields_are_left_out():
+    prompt = app.build_user_prompt({"Headline": "N/A", "OtherSkills": [], "CityName": None}, {}, 72)
+    assert "Headline" not in prompt and "Other Skills" not in prompt and "City" not in prompt
+    assert prompt.count("- None provided") == 2
+
+
+def test_blank_items_count_as_empty():
+    member = {"LeadershipNames": ["", " "], "OtherSkills": " ; , ", "TechnicalSkillNames": ["Python", " ", None]}
+    prompt = app.build_user_prompt(member, {"JobTitle": "Engineer"}, 72)
+    assert "Leadership" not in prompt and "Other Skills" not in prompt
+    assert "- Technical Skills: Python\n" in prompt
+
+
+def test_blank_fields_do_not_route_to_the_deep_model():
+    member = {key: ["", " "] for key in app.MEMBER_PROMPT_KEYS}
+    assert app.select_model(member, 90) == app.DEFAULT_MODEL
+    member = {key: ["Python"] for key in app.MEMBER_PROMPT_KEYS}
+    assert app.select_model(member, 90) == app.DEEP_REASONING_MODEL
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize("path", ["/analyze_job_match", "/analyze_job_match/stream"])
+@pytest.mark.parametrize("body", [b"{not json", b""])
+def test_malformed_json_is_a_bad_request(path, body):
+    async def run():
+        response = await app.app.test_client().post(path, data=body, headers={"Content-Type": "application/json"})
+        return response.status_code, await response.get_json()
+
+    status, payload = asyncio.run(run())
+    assert status == 400
+    assert payload["error"].startswith("Invalid data format")
+
+
+def post(body):
+    async def run():
+        response = await app.app.test_client().post("/analyze_job_match", json=body)
+        return response.status_code, await response.get_json()
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("data", [
+    {"member": {}, "jobpost": {"JobTitle": "Engineer"}, "Matching_Percentage": 50},
+    {"member": {"Headline": "Developer"}, "jobpost": {"JobTitle": "Engineer"}, "Matching_Percentage": 101},
+    {"member": "Developer", "jobpost": {"JobTitle": "Engineer"}},
+])
+def test_invalid_payload_is_a_bad_request(data):
+    status, payload = post({"data": data})
+    assert status == 400
+    assert payload["error"] == "Invalid data format."
+    assert payload["details"]
+
+
+def test_oversized_prompt_is_rejected(monkeypatch):
+    monkeypatch.setattr(app, "MAX_PROMPT_TOKENS", 50)
+    status, payload = post({"data": {
+        "member": {"Headline": "Developer " * 100},
+        "jobpost": {"JobTitle": "Engineer"},
+        "Matching_Percentage": 50
+    }})
+    assert status == 413
+    assert payload["error"].startswith("Input too large")